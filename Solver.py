@@ -15,6 +15,9 @@ import scipy.sparse.linalg as spla
 import numpy as np
 
 
+# Local node pairs of the tri3 edges 1-3 (edge_id - 1 indexes the rows)
+EDGE_TABLE = np.array([[0, 1], [1, 2], [2, 0]], dtype=np.int64)
+
 
 def element_stiffness_triangle(node_coords, k=1.0):
     """
@@ -25,144 +28,359 @@ def element_stiffness_triangle(node_coords, k=1.0):
     x1, y1 = node_coords[0, 0], node_coords[0, 1]
     x2, y2 = node_coords[1, 0], node_coords[1, 1]
     x3, y3 = node_coords[2, 0], node_coords[2, 1]
-    
-    
-    J = np.array([[x2-x1,x3-x1],[y2-y1,y3-y1]])
-    det_J = np.linalg.det(J)
-    abs_det_J = np.absolute(det_J)
-    area = 0.5*abs_det_J# element area
-
-     # Shape function derivatives (constant over element)
-    B = (1/(np.linalg.det(J))) * np.array([[(y2-y3),(y3-y1)],[(x3-x2),(x1-x3)]]) @ np.array([[1,0,-1],[0,1,-1]])
-     
-    Ke = k * area * (B.T @ B)
+
+    dx32, dx13 = x3-x2, x1-x3
+    dy23, dy31 = y2-y3, y3-y1
+    det_J = (x2-x1)*(y3-y1) - (x3-x1)*(y2-y1)
+    inv_det = 1.0/det_J
+
+    # Shape function derivatives (constant over element)
+    b = np.array([dy23, dy31, -(dy23+dy31)])*inv_det
+    c = np.array([dx32, dx13, -(dx32+dx13)])*inv_det
+
+    Ke = (k*0.5*abs(det_J)) * (np.outer(b, b) + np.outer(c, c))
     return Ke
 
 
-def assemble_global(nodes, elems, k=2.5): 
+def element_stiffness_triangles(node_coords, k=1.0, dtype=np.float32):
+    """
+    Batched linear triangular element stiffness for all elements at once
+    node_coords: (M,3,2) array of element node coordinates
+    dtype: precision of the element computation; float32 halves the memory
+           traffic. Edge vectors are always formed in float64 first, so the
+           rounding error scales with the element size, not its position.
+    returns (M,3,3) array of element stiffness matrices
+    """
+    node_coords = np.asarray(node_coords, dtype=np.float64)
+    e21 = (node_coords[:, 1] - node_coords[:, 0]).astype(dtype, copy=False)
+    e31 = (node_coords[:, 2] - node_coords[:, 0]).astype(dtype, copy=False)
+    x21, y21 = e21[:, 0], e21[:, 1]
+    x31, y31 = e31[:, 0], e31[:, 1]
+
+    det_J = x21*y31 - x31*y21
+    area = 0.5*np.absolute(det_J)  # element areas
+
+    # Shape function derivatives (constant over each element)
+    B = np.empty((node_coords.shape[0], 2, 3), dtype=dtype)
+    B[:, 0, 0] = y21 - y31  # y2 - y3
+    B[:, 0, 1] = y31        # y3 - y1
+    B[:, 0, 2] = -y21       # y1 - y2
+    B[:, 1, 0] = x31 - x21  # x3 - x2
+    B[:, 1, 1] = -x31       # x1 - x3
+    B[:, 1, 2] = x21        # x2 - x1
+    B /= det_J[:, None, None]
+
+    Ke = k * area[:, None, None] * np.einsum('mki,mkj->mij', B, B)
+    return Ke
+
+
+class TripletAccumulator:
+    """
+    Preallocated COO triplet storage shared by assembly and BC routines,
+    so the global matrix is converted to CSR only once.
+    shape: (nnodes, nnodes) shape of the global matrix
+    capacity: total number of triplets, e.g. 9*nelems + 4*Nconv
+    """
+
+    def __init__(self, shape, capacity):
+        self.shape = shape
+        self.rows = np.empty(capacity, dtype=np.int32)
+        self.cols = np.empty(capacity, dtype=np.int32)
+        self.data = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    def reserve(self, n):
+        """Return (rows, cols, data) views of the next n free slots"""
+        start, stop = self.size, self.size + n
+        if stop > self.data.shape[0]:
+            raise ValueError(f"TripletAccumulator capacity {self.data.shape[0]} exceeded")
+        self.size = stop
+        return self.rows[start:stop], self.cols[start:stop], self.data[start:stop]
+
+    def clear(self):
+        """Discard the filled slots so the buffer can be refilled, e.g. for reassembly"""
+        self.size = 0
+
+    def tocsr(self, context=None):
+        """
+        Sum duplicate entries and return the global matrix in CSR format
+        context: optional AssemblyContext built from the same triplet layout;
+                 the cached pattern is reused instead of sorting again
+        """
+        n = self.size
+        if context is not None:
+            return context.assemble(self.data[:n])
+        K = sp.coo_matrix((self.data[:n], (self.rows[:n], self.cols[:n])), shape=self.shape)
+        K.sum_duplicates()
+        return K.tocsr()
+
+
+class AssemblyContext:
+    """
+    Cached COO->CSR sparsity pattern for a fixed mesh, so repeated assembly
+    (nonlinear or transient loops) only recomputes the values.
+    rows, cols: COO triplet indices, in the order the values will be given
+    shape: (nnodes, nnodes) shape of the global matrix
+    The CSR matrix returned by assemble() is reused and updated in place.
+    A context built from a TripletAccumulator that also holds convection
+    entries expects those values too: refill the accumulator and call
+    triplets.tocsr(context), or pass them to assemble() as extra.
+    """
+
+    def __init__(self, rows, cols, shape):
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+        ntrip = rows.shape[0]
+        self.ntrip = ntrip
+
+        # Sort triplets row-major and find the first triplet of each CSR slot
+        perm = np.lexsort((cols, rows))
+        r, c = rows[perm], cols[perm]
+        first = np.ones(ntrip, dtype=bool)
+        first[1:] = (r[1:] != r[:-1]) | (c[1:] != c[:-1])
+        slot = np.empty(ntrip, dtype=np.int64)
+        slot[perm] = np.cumsum(first) - 1
+        nnz = int(first.sum())
+
+        # (nnz, ntrip) 0/1 matrix summing the triplets that collapse into each slot
+        self.coo_to_csr = sp.csr_matrix((np.ones(ntrip), (slot, np.arange(ntrip))),
+                                        shape=(nnz, ntrip))
+        indptr = np.zeros(shape[0] + 1, dtype=np.int32)
+        np.cumsum(np.bincount(r[first], minlength=shape[0]), out=indptr[1:])
+        self.matrix = sp.csr_matrix((np.zeros(nnz), c[first].astype(np.int32), indptr),
+                                    shape=shape)
+
+    @classmethod
+    def from_triplets(cls, triplets):
+        """Build the context from the filled slots of a TripletAccumulator"""
+        n = triplets.size
+        return cls(triplets.rows[:n], triplets.cols[:n], triplets.shape)
+
+    def assemble(self, data, extra=None):
+        """
+        Scatter new triplet values into the cached CSR matrix
+        data: values in the order of the rows/cols the context was built from
+        extra: optional values appended after data (e.g. convection entries)
+        """
+        if extra is not None:
+            data = np.concatenate([data, extra])
+        if data.shape[0] != self.ntrip:
+            raise ValueError(f"AssemblyContext was built for {self.ntrip} triplets, "
+                             f"got {data.shape[0]} values")
+        self.matrix.data[:] = self.coo_to_csr @ data
+        return self.matrix
+
+
+def assemble_global(nodes, elems, k=2.5, triplets=None, context=None, dtype=np.float32): 
     """
     Assemble global stiffness matrix for triangular mesh
     nodes: Nx2 or Nx3 array
     elems: Mx3 array of node indices (0-based)
     k: thermal conductivity
-    returns: K (sparse CSR matrix)
+    triplets: optional TripletAccumulator to write the element entries into
+    context: optional AssemblyContext built for the element triplets of this mesh;
+             only the values are recomputed. When the context also covers convection
+             entries, fill triplets instead and call triplets.tocsr(context).
+    dtype: precision of the element computation; the matrix itself is always float64
+    returns: K (sparse CSR matrix), or triplets if given
     """
     nnodes = nodes.shape[0]
     nelems = elems.shape[0]
-    rows = []
-    cols = []
-    data = []
-   
-    for e in range(nelems):
-        conn = elems[e]
-        coords = nodes[conn, :2]  # take x,y only
-       
-        Ke = element_stiffness_triangle(coords, k=k)
-       
-        for i_local, i_global in enumerate(conn):
-            
-            for j_local, j_global in enumerate(conn):
-                # Assemble global Matrix K
-                rows.append(i_global) 
-                cols.append(j_global) 
-                data.append(Ke[i_local, j_local]) 
-
-    K = sp.coo_matrix((data, (rows, cols)), shape=(nnodes, nnodes)).tocsr() 
-    
-    return K.toarray()
+    if context is not None and triplets is not None:
+        raise ValueError("pass the context to triplets.tocsr() when assembling into a TripletAccumulator")
+    if context is not None:
+        Ke = element_stiffness_triangles(nodes[elems, :2], k=k, dtype=dtype)
+        return context.assemble(Ke.reshape(-1).astype(np.float64))
+
+    acc = triplets if triplets is not None else TripletAccumulator((nnodes, nnodes), 9*nelems)
+    rows, cols, data = acc.reserve(9*nelems)
 
+    coords = nodes[elems, :2]  # (M,3,2), take x,y only
 
+    # Global triplets: 9 entries per element, row-major within each Ke
+    rows.reshape(nelems, 3, 3)[:] = elems[:, :, None]
+    cols.reshape(nelems, 3, 3)[:] = elems[:, None, :]
+    data.reshape(nelems, 3, 3)[:] = element_stiffness_triangles(coords, k=k, dtype=dtype)
 
-def apply_dirichlet(K, f, bc_nodes, bc_values):
+    if triplets is not None:
+        return triplets
+    return acc.tocsr()
+
+
+
+def apply_dirichlet(K, f, bc_nodes, bc_values, inplace=False):
     """
-    Apply Dirichlet boundary conditions to the global matrix
+    Apply Dirichlet boundary conditions to the global matrix by elimination:
+    the known values are moved to the right-hand side of the free equations
+    and the BC rows/columns are replaced by identity rows.
+    K: sparse global matrix
     bc_nodes: array of node indices
     bc_values: array of prescribed values
+    inplace: modify f directly instead of working on a copy
     """
+    nnodes = K.shape[0]
+    bc_nodes = np.atleast_1d(np.asarray(bc_nodes, dtype=int))
+    bc_values = np.atleast_1d(np.asarray(bc_values, dtype=float))
+
+    is_bc = np.zeros(nnodes, dtype=bool)
+    is_bc[bc_nodes] = True
+    free = ~is_bc
+    u_bc = np.zeros(nnodes)
+    u_bc[bc_nodes] = bc_values
+
+    K = K.tocsr()
+    if not inplace:
+        f = f.copy()
+    f[free] -= K[free][:, is_bc] @ u_bc[is_bc]
+    f[is_bc] = u_bc[is_bc]
 
-    f = f.copy()
-    for node, val in zip(np.atleast_1d(bc_nodes), np.atleast_1d(bc_values)):
-        #modify K and f accordingly    
-       K[node, :] = 0
-       K[:, node] = 0
-       K[node, node] = 1
-       f[node] = val
+    # zero BC rows/columns and put 1 on their diagonal
+    D = sp.diags(is_bc.astype(float))
+    D_free = sp.diags(free.astype(float))
+    K = (D_free @ K @ D_free + D).tocsr()
     return K, f
 
-def apply_heat_flux(f, nodes, elems, heat_flux_bcs):
+
+def _edge_geometry(nodes, elems, elem_ids, edge_ids):
+    """
+    Global node indices and lengths of element edges
+    elem_ids: (Nbc,) element indices (0-based)
+    edge_ids: (Nbc,) local edge ids (1-3 for tri3)
+    returns: (Nbc,2) global node indices, (Nbc,) edge lengths
+    """
+    conn = elems[elem_ids]                                # (Nbc,3)
+    edge_nodes = EDGE_TABLE[edge_ids.astype(np.int64) - 1]  # (Nbc,2) local indices
+    global_nodes = np.take_along_axis(conn, edge_nodes, axis=1)
+
+    p1 = nodes[global_nodes[:, 0], :2]
+    p2 = nodes[global_nodes[:, 1], :2]
+    L = np.hypot(p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1])
+    return global_nodes, L
+
+
+def precompute_edge_data(nodes, elems, bcs):
+    """
+    Gather boundary-edge geometry once so repeated BC application
+    (e.g. in a transient or nonlinear loop) does not redo it.
+    bcs: dict with 'heat_flux' and 'convection' lists as read by read_input_file
+    returns: dict with flux_global_nodes (Nf,2), flux_L (Nf,),
+             conv_global_nodes (Nc,2), conv_L (Nc,)
+    """
+    edge_data = {}
+    for key, name, ncols in (('flux', 'heat_flux', 3), ('conv', 'convection', 4)):
+        bc_arr = np.asarray(bcs.get(name, []), dtype=float).reshape(-1, ncols)
+        global_nodes, L = _edge_geometry(nodes, elems,
+                                         bc_arr[:, 0].astype(int),
+                                         bc_arr[:, 1].astype(int))
+        edge_data[key + '_global_nodes'] = global_nodes
+        edge_data[key + '_L'] = L
+    return edge_data
+
+
+def apply_heat_flux(f, nodes, elems, heat_flux_bcs, edge_data=None, inplace=False):
     """
     Apply Neumann (heat flux) BCs to load vector.
     Each BC: (elem_id, edge_id, q)
+    edge_data: optional cached geometry from precompute_edge_data
+    inplace: add the loads to f directly instead of to a copy
     """
-    fmod = f.copy()
+    fmod = f if inplace else f.copy()
+    if len(heat_flux_bcs) == 0:
+        return fmod
 
-    for elem_id, edge_id, q in heat_flux_bcs:
-     
-    
-        conn = elems[int(elem_id)]       
-        coords = nodes[conn, :2]      
-    
-    
-        edge_nodes = {
-            1: [0, 1],
-            2: [1, 2],
-            3: [2, 0]
-        }[int(edge_id)]
-
-        n1, n2 = edge_nodes
-        x1, y1 = coords[n1]
-        x2, y2 = coords[n2]
-    
-        L = np.hypot(x2 - x1, y2 - y1)
-      
-        fe = (q * L / 2.0) * np.array([1.0, 1.0])
+    flux_arr = np.asarray(heat_flux_bcs, dtype=float).reshape(-1, 3)
+    q = flux_arr[:, 2]
+    if edge_data is None:
+        global_nodes, L = _edge_geometry(nodes, elems,
+                                         flux_arr[:, 0].astype(int),
+                                         flux_arr[:, 1].astype(int))
+    else:
+        global_nodes, L = edge_data['flux_global_nodes'], edge_data['flux_L']
 
-        fmod[conn[edge_nodes]] += fe
+    fe = (q * L / 2.0)[:, None] * np.ones(2)
+
+    # add.at so that nodes shared by several flux edges accumulate
+    np.add.at(fmod, global_nodes, fe)
     
     return fmod
 
 
-def apply_convection(K, f, nodes, elems, conv_bcs):
+def apply_convection(K, f, nodes, elems, conv_bcs, edge_data=None, inplace=False):
     """
     Apply Robin (convection) BCs to load vector & matrix K.
     Each BC: (elem_id, edge_id, h, Tinf)
+    K: sparse global matrix, or a TripletAccumulator to append the edge entries to
+    edge_data: optional cached geometry from precompute_edge_data
+    inplace: add the loads to f directly and skip copying K when there is nothing to add
     """
-    Kmod = K.copy()
-    fmod = f.copy()
+    fmod = f if inplace else f.copy()
+    if len(conv_bcs) == 0:
+        return (K if inplace or isinstance(K, TripletAccumulator) else K.copy()), fmod
 
-    for elem_id, edge_id, h, Tinf in conv_bcs:
-        
-        conn = elems[int(elem_id)]       
-        coords = nodes[conn, :2]
-        edge_nodes = {
-            1: [0,1],
-            2: [1,2],
-            3: [2,0]
-        }[int(edge_id)]
-        n1, n2 = edge_nodes
-        x1, y1 = coords[n1]
-        x2, y2 = coords[n2]
-        L = np.hypot(x2 - x1, y2 - y1)
-        #Modify K and F accordingly
-        
-        K = (h * L / 6.0) * np.array([[2.0, 1.0],
-                                          [1.0, 2.0]])
-        f = (h * Tinf * L / 2.0) * np.array([1.0, 1.0])
-        
-        fmod[conn[edge_nodes]] += f
-        
-        global_nodes = conn[edge_nodes]      
-        gn1, gn2 = global_nodes              
+    conv_arr = np.asarray(conv_bcs, dtype=float).reshape(-1, 4)
+    h = conv_arr[:, 2]
+    Tinf = conv_arr[:, 3]
+    if edge_data is None:
+        global_nodes, L = _edge_geometry(nodes, elems,
+                                         conv_arr[:, 0].astype(int),
+                                         conv_arr[:, 1].astype(int))
+    else:
+        global_nodes, L = edge_data['conv_global_nodes'], edge_data['conv_L']
+
+    # Edge matrices (h*L/6)*[[2,1],[1,2]] and loads (h*Tinf*L/2)*[1,1]
+    Ke = (h * L / 6.0)[:, None, None] * np.array([[2.0, 1.0],
+                                                  [1.0, 2.0]])
+    fe = (h * Tinf * L / 2.0)[:, None] * np.ones(2)
+    np.add.at(fmod, global_nodes, fe)
 
-        Kmod[gn1, gn1] += K[0, 0]
-        Kmod[gn1, gn2] += K[0, 1]
-        Kmod[gn2, gn1] += K[1, 0]
-        Kmod[gn2, gn2] += K[1, 1]
+    nbc = global_nodes.shape[0]
+    acc = K if isinstance(K, TripletAccumulator) else TripletAccumulator(K.shape, 4*nbc)
+    rows, cols, data = acc.reserve(4*nbc)
+    rows.reshape(nbc, 2, 2)[:] = global_nodes[:, :, None]
+    cols.reshape(nbc, 2, 2)[:] = global_nodes[:, None, :]
+    data.reshape(nbc, 2, 2)[:] = Ke
+
+    if isinstance(K, TripletAccumulator):
+        return K, fmod
+    Kmod = K + acc.tocsr()
         
     return Kmod, fmod
 
 
-def solve_system(K, f):
-    """Solve the linear system Ku=f"""
-    u = spla.spsolve(K, f)
+def solve_system(K, f, solver='spsolve'):
+    """
+    Solve the linear system Ku=f
+    solver: 'spsolve' (SuperLU, default), 'cholmod' (scikit-sparse Cholesky),
+            'pardiso' (pypardiso) or 'cg' (Jacobi-preconditioned CG).
+    After apply_dirichlet K is symmetric positive-definite, so the Cholesky,
+    PARDISO (run as real SPD, mtype=2, on the upper triangle) and CG
+    backends all apply.
+    """
+    if solver == 'spsolve':
+        u = spla.spsolve(K, f)
+    elif solver == 'cholmod':
+        from sksparse.cholmod import cholesky
+        factor = cholesky(sp.csc_matrix(K))
+        u = factor(f)
+    elif solver == 'pardiso':
+        import pypardiso
+        ps = pypardiso.PyPardisoSolver(mtype=2)  # real symmetric positive-definite
+        u = pypardiso.spsolve(sp.triu(K, format='csr'), f, solver=ps)
+    elif solver == 'cg':
+        u = solve_system_cg(K, f)
+    else:
+        raise ValueError(f"Unknown solver '{solver}'")
+    return u
+
+
+def solve_system_cg(K, f, M=None, rtol=1e-10):
+    """
+    Solve the SPD system Ku=f iteratively with conjugate gradients
+    M: preconditioner, defaults to Jacobi (inverse diagonal of K)
+    """
+    if M is None:
+        M = sp.diags(1.0/K.diagonal())
+    u, info = spla.cg(K, f, M=M, rtol=rtol, atol=0.0)
+    if info != 0:
+        raise RuntimeError(f"CG did not converge (info={info})")
     return u
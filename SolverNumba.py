@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The SEMFE Heat Transfer Solver
+Computational Mechanics
+
+Solver Script (Numba-compiled assembly and BC kernels)
+"""
+
+import scipy.sparse as sp
+import numpy as np
+from numba import njit, prange, get_num_threads
+from Solver import TripletAccumulator, EDGE_TABLE
+
+
+@njit(cache=True, fastmath=True)
+def element_stiffness_triangle(node_coords, k, Ke):
+    """
+    Linear triangular element stiffness for steady-state conduction (Poisson equation)
+    node_coords: (3,2) or (3,3) array of node coordinates
+    k: thermal conductivity
+    Ke: preallocated (3,3) output array, overwritten with the element stiffness
+    """
+    x1, y1 = node_coords[0, 0], node_coords[0, 1]
+    x2, y2 = node_coords[1, 0], node_coords[1, 1]
+    x3, y3 = node_coords[2, 0], node_coords[2, 1]
+
+    det_J = (x2-x1)*(y3-y1) - (x3-x1)*(y2-y1)
+    area = 0.5*abs(det_J)  # element area
+
+    # Shape function derivatives (constant over element)
+    inv_det = 1.0/det_J
+    b0, b1, b2 = (y2-y3)*inv_det, (y3-y1)*inv_det, (y1-y2)*inv_det
+    c0, c1, c2 = (x3-x2)*inv_det, (x1-x3)*inv_det, (x2-x1)*inv_det
+
+    s = k*area
+    Ke[0, 0] = s*(b0*b0 + c0*c0)
+    Ke[0, 1] = s*(b0*b1 + c0*c1)
+    Ke[0, 2] = s*(b0*b2 + c0*c2)
+    Ke[1, 1] = s*(b1*b1 + c1*c1)
+    Ke[1, 2] = s*(b1*b2 + c1*c2)
+    Ke[2, 2] = s*(b2*b2 + c2*c2)
+    Ke[1, 0] = Ke[0, 1]
+    Ke[2, 0] = Ke[0, 2]
+    Ke[2, 1] = Ke[1, 2]
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def assemble_kernel(nodes, elems, k, rows, cols, data):
+    """
+    Fill the COO triplets of the global stiffness matrix
+    nodes: Nx2 or Nx3 array
+    elems: Mx3 array of node indices (0-based)
+    rows, cols, data: preallocated arrays of length 9*M
+    Element e writes only to slots 9*e..9*e+9, so no atomics are needed.
+    """
+    nelems = elems.shape[0]
+    for e in prange(nelems):
+        coords = np.empty((3, 2))
+        for a in range(3):
+            coords[a, 0] = nodes[elems[e, a], 0]
+            coords[a, 1] = nodes[elems[e, a], 1]
+
+        Ke = np.empty((3, 3))
+        element_stiffness_triangle(coords, k, Ke)
+
+        offset = 9*e
+        for i in range(3):
+            for j in range(3):
+                rows[offset] = elems[e, i]
+                cols[offset] = elems[e, j]
+                data[offset] = Ke[i, j]
+                offset += 1
+
+
+def assemble_global(nodes, elems, k=2.5):
+    """
+    Assemble global stiffness matrix for triangular mesh
+    nodes: Nx2 or Nx3 array
+    elems: Mx3 array of node indices (0-based)
+    k: thermal conductivity
+    returns: K (sparse CSR matrix)
+    """
+    nnodes = nodes.shape[0]
+    nelems = elems.shape[0]
+    rows = np.empty(9*nelems, dtype=np.int32)
+    cols = np.empty(9*nelems, dtype=np.int32)
+    data = np.empty(9*nelems, dtype=np.float64)
+
+    assemble_kernel(np.ascontiguousarray(nodes, dtype=np.float64),
+                    np.ascontiguousarray(elems, dtype=np.int64),
+                    float(k), rows, cols, data)
+
+    K = sp.coo_matrix((data, (rows, cols)), shape=(nnodes, nnodes)).tocsr()
+
+    return K
+
+
+@njit(cache=True)
+def _edge_endpoints(elems, elem_id, edge_id):
+    """Global node indices of local edge edge_id (1-3) of element elem_id"""
+    n1, n2 = EDGE_TABLE[edge_id - 1, 0], EDGE_TABLE[edge_id - 1, 1]
+    return elems[elem_id, n1], elems[elem_id, n2]
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def edge_geometry_kernel(nodes, elems, elem_ids, edge_ids, global_nodes, L):
+    """
+    Global node indices and lengths of element edges
+    global_nodes: preallocated (Nbc,2) output, L: preallocated (Nbc,) output
+    """
+    for i in prange(elem_ids.shape[0]):
+        g1, g2 = _edge_endpoints(elems, elem_ids[i], edge_ids[i])
+        global_nodes[i, 0] = g1
+        global_nodes[i, 1] = g2
+        L[i] = np.hypot(nodes[g2, 0] - nodes[g1, 0], nodes[g2, 1] - nodes[g1, 1])
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def heat_flux_kernel(fmod, global_nodes, L, q, nchunks):
+    """
+    Add Neumann (heat flux) edge loads to fmod in place
+    BCs are split into nchunks contiguous batches; each batch accumulates
+    into its own row of a thread-local buffer that is reduced at the end,
+    so edges sharing a node never race.
+    """
+    nbc = global_nodes.shape[0]
+    chunk = (nbc + nchunks - 1) // nchunks
+    f_thr = np.zeros((nchunks, fmod.shape[0]))
+    for t in prange(nchunks):
+        for i in range(t*chunk, min((t+1)*chunk, nbc)):
+            g1, g2 = global_nodes[i, 0], global_nodes[i, 1]
+            fe = q[i] * L[i] / 2.0
+            f_thr[t, g1] += fe
+            f_thr[t, g2] += fe
+    for t in range(nchunks):
+        fmod += f_thr[t]
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def convection_kernel(fmod, global_nodes, L, h, Tinf, nchunks, rows, cols, data):
+    """
+    Add Robin (convection) edge loads to fmod in place and fill the edge
+    matrix triplets; BC i writes only to slots 4*i..4*i+4 of rows/cols/data.
+    """
+    nbc = global_nodes.shape[0]
+    chunk = (nbc + nchunks - 1) // nchunks
+    f_thr = np.zeros((nchunks, fmod.shape[0]))
+    for t in prange(nchunks):
+        for i in range(t*chunk, min((t+1)*chunk, nbc)):
+            g1, g2 = global_nodes[i, 0], global_nodes[i, 1]
+            fe = h[i] * Tinf[i] * L[i] / 2.0
+            f_thr[t, g1] += fe
+            f_thr[t, g2] += fe
+
+            # (h*L/6)*[[2,1],[1,2]]
+            kd = h[i] * L[i] / 3.0
+            ko = h[i] * L[i] / 6.0
+            offset = 4*i
+            rows[offset], cols[offset], data[offset] = g1, g1, kd
+            rows[offset+1], cols[offset+1], data[offset+1] = g1, g2, ko
+            rows[offset+2], cols[offset+2], data[offset+2] = g2, g1, ko
+            rows[offset+3], cols[offset+3], data[offset+3] = g2, g2, kd
+    for t in range(nchunks):
+        fmod += f_thr[t]
+
+
+def _edge_geometry(nodes, elems, bc_arr, edge_data, key):
+    """Cached (global_nodes, L) from edge_data, or computed from the BC array"""
+    if edge_data is not None:
+        return (np.ascontiguousarray(edge_data[key + '_global_nodes'], dtype=np.int64),
+                np.ascontiguousarray(edge_data[key + '_L'], dtype=np.float64))
+    nbc = bc_arr.shape[0]
+    global_nodes = np.empty((nbc, 2), dtype=np.int64)
+    L = np.empty(nbc)
+    edge_geometry_kernel(np.ascontiguousarray(nodes, dtype=np.float64),
+                         np.ascontiguousarray(elems, dtype=np.int64),
+                         bc_arr[:, 0].astype(np.int64), bc_arr[:, 1].astype(np.int64),
+                         global_nodes, L)
+    return global_nodes, L
+
+
+def apply_heat_flux(f, nodes, elems, heat_flux_bcs, edge_data=None, inplace=False):
+    """
+    Apply Neumann (heat flux) BCs to load vector.
+    Each BC: (elem_id, edge_id, q)
+    edge_data: optional cached geometry from Solver.precompute_edge_data
+    inplace: add the loads to f (float64 array) directly instead of to a copy
+    """
+    fmod = f if inplace else np.array(f, dtype=np.float64)
+    if len(heat_flux_bcs) == 0:
+        return fmod
+
+    flux_arr = np.asarray(heat_flux_bcs, dtype=float).reshape(-1, 3)
+    global_nodes, L = _edge_geometry(nodes, elems, flux_arr, edge_data, 'flux')
+    heat_flux_kernel(fmod, global_nodes, L, np.ascontiguousarray(flux_arr[:, 2]),
+                     get_num_threads())
+    return fmod
+
+
+def apply_convection(K, f, nodes, elems, conv_bcs, edge_data=None, inplace=False):
+    """
+    Apply Robin (convection) BCs to load vector & matrix K.
+    Each BC: (elem_id, edge_id, h, Tinf)
+    K: sparse global matrix, or a TripletAccumulator to append the edge entries to
+    edge_data: optional cached geometry from Solver.precompute_edge_data
+    inplace: add the loads to f (float64 array) directly and skip copying K when there is nothing to add
+    """
+    fmod = f if inplace else np.array(f, dtype=np.float64)
+    if len(conv_bcs) == 0:
+        return (K if inplace or isinstance(K, TripletAccumulator) else K.copy()), fmod
+
+    conv_arr = np.asarray(conv_bcs, dtype=float).reshape(-1, 4)
+    nbc = conv_arr.shape[0]
+    global_nodes, L = _edge_geometry(nodes, elems, conv_arr, edge_data, 'conv')
+    acc = K if isinstance(K, TripletAccumulator) else TripletAccumulator(K.shape, 4*nbc)
+    rows, cols, data = acc.reserve(4*nbc)
+
+    convection_kernel(fmod, global_nodes, L,
+                      np.ascontiguousarray(conv_arr[:, 2]), np.ascontiguousarray(conv_arr[:, 3]),
+                      get_num_threads(), rows, cols, data)
+
+    if isinstance(K, TripletAccumulator):
+        return K, fmod
+    Kmod = K + acc.tocsr()
+    return Kmod, fmod
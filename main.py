@@ -9,10 +9,9 @@ Main Script
 import numpy as np
 from PreProcessor import read_input_file
 from Solver import assemble_global, apply_convection, apply_dirichlet
-from Solver import apply_heat_flux, solve_system
+from Solver import apply_heat_flux, solve_system, TripletAccumulator
 from PostProcessor import plot_mesh, plot_mesh_interactive, plot_temperature_field
 from PostProcessor import export_temperature_csv
-from Solver import element_stiffness_triangle # vgalto
 
 
 # Import model info
@@ -26,24 +25,32 @@ nnodes = nodes.shape[0]
 nelems = elems.shape[0]
 
 
-for e in range(nelems):
-     conn = elems[e]
-     coords = nodes[conn, :2]  # take x,y only
-     Ke = element_stiffness_triangle(coords, k=k)
-
-# Assemble global
-K = assemble_global(nodes, elems, k=k)
-fmod = np.zeros(nodes.shape[0], dtype=float)
+# Degenerate element check (either node ordering is fine, the solver uses |det J|)
+coords = nodes[elems, :2]
+det_J = (coords[:, 1, 0]-coords[:, 0, 0])*(coords[:, 2, 1]-coords[:, 0, 1]) \
+      - (coords[:, 2, 0]-coords[:, 0, 0])*(coords[:, 1, 1]-coords[:, 0, 1])
+tol = 1e-12 * np.ptp(nodes[:, :2], axis=0).max()**2
+degenerate = np.flatnonzero(np.abs(det_J) <= tol)
+if degenerate.size:
+    raise ValueError(f"mesh has {degenerate.size} degenerate elements, e.g. element {degenerate[0] + 1}")
 
 # Apply BCs
 bc_nodes = [node for node, val in bcs['temperature']]
 bc_values = [val for node, val in bcs['temperature']]
 heat_flux_bcs = bcs['heat_flux']
 conv_bcs = bcs['convection']
-fmod       = apply_heat_flux(fmod, nodes, elems,heat_flux_bcs )
-Kmod, fmod = apply_convection(K, fmod, nodes, elems, conv_bcs)
 
-Kmod, fmod = apply_dirichlet(K,fmod , bc_nodes, bc_values)
+# Assemble global (element and convection entries share one triplet buffer)
+triplets = TripletAccumulator((nnodes, nnodes), 9*nelems + 4*len(conv_bcs))
+assemble_global(nodes, elems, k=k, triplets=triplets)
+fmod = np.zeros(nodes.shape[0], dtype=float)
+
+# fmod is only used here, so the BC routines can update it without copying
+fmod       = apply_heat_flux(fmod, nodes, elems,heat_flux_bcs, inplace=True)
+triplets, fmod = apply_convection(triplets, fmod, nodes, elems, conv_bcs, inplace=True)
+K = triplets.tocsr()
+
+Kmod, fmod = apply_dirichlet(K,fmod , bc_nodes, bc_values, inplace=True)
 
 
 